@@ -8,7 +8,10 @@ import os
 import sys
 import logging
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, UnicodeDammit
+from lxml import etree, html
 
 # 设置 UTF-8 输出，避免 Windows 下 GBK 编码问题
 if sys.platform == 'win32':
@@ -27,17 +30,41 @@ logger = logging.getLogger(__name__)
 # 固定基础 URL
 BASE_URL = "http://100.68.66.102:18001/views/article/"
 
+# 连接池配置
+POOL_SIZE = 5
+
+# 复用 HTTP 连接（keep-alive + 连接池）
+SESSION = requests.Session()
+SESSION.headers.update({'Accept-Encoding': 'gzip, deflate'})
+_adapter = HTTPAdapter(
+    pool_connections=POOL_SIZE,
+    pool_maxsize=POOL_SIZE * 2,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# 原文链接 a 标签的文本
+ORIGINAL_LINK_TEXT = "🔗 原文链接"
+
+# 已找到的原文链接缓存（URL -> 原文链接），只缓存成功结果，失败或未找到时下次仍会重新请求
+ORIGINAL_LINK_CACHE_SIZE = 1024
+_original_link_cache = {}
+
+# 预编译的原文链接 XPath，只取第一个匹配的 href，文本通过 $text 变量传入
+ORIGINAL_LINK_XPATH = etree.XPath('(//a[@href][normalize-space(.)=$text]/@href)[1]')
+
 def extract_links_from_url(url):
     """
     从指定 URL 提取超链接
     """
     try:
         logger.info(f"访问 URL: {url}")
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
         
         # 解析 HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(response.content, 'lxml')
         
         # 提取所有超链接
         links = []
@@ -58,30 +85,36 @@ def extract_links_from_url(url):
 
 def find_original_link(url):
     """
-    从指定 URL 中查找原文链接
+    从指定 URL 中查找原文链接（成功结果按 URL 缓存，重复调用不再请求）
     """
+    cached = _original_link_cache.get(url)
+    if cached is not None:
+        return cached
+
     try:
         logger.info(f"查找原文链接: {url}")
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
         
-        # 解析 HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # 解析 HTML，精确定位包含"🔗 原文链接"文本的a标签
+        # 页面可能没有 <meta charset>，lxml 会按 latin-1 解码导致匹配失败，
+        # 因此先用 UnicodeDammit 探测编码再显式指定
+        encoding = UnicodeDammit(response.content, is_html=True).original_encoding or 'utf-8'
+        tree = html.fromstring(response.content, parser=html.HTMLParser(encoding=encoding))
+        hrefs = ORIGINAL_LINK_XPATH(tree, text=ORIGINAL_LINK_TEXT)
         
-        # 精确定位包含"🔗 原文链接"文本的a标签
         original_link = None
-        for a_tag in soup.find_all('a', href=True):
-            text = a_tag.get_text(strip=True)
-            if '🔗 原文链接' == text:
-                href = a_tag.get('href')
-                # 处理href中可能的反引号包围
-                if href.startswith('`') and href.endswith('`'):
-                    href = href.strip('`')
-                original_link = href
-                break
+        if hrefs:
+            href = str(hrefs[0])
+            # 处理href中可能的反引号包围
+            if href.startswith('`') and href.endswith('`'):
+                href = href.strip('`')
+            original_link = href
         
         if original_link:
             logger.info(f"找到原文链接: {original_link}")
+            if len(_original_link_cache) < ORIGINAL_LINK_CACHE_SIZE:
+                _original_link_cache[url] = original_link
             return original_link
         else:
             logger.warning("未找到原文链接")
@@ -5,26 +5,32 @@ AI 日报自动化系统
 - 从 RSS 源抓取最近 48 小时内容
 - 使用大模型 API 评分并生成日报（支持 OpenAI / 通义千问 / ARK）
 - 发送到飞书群（自定义机器人 + 签名校验）
-- 基于 sha256(link) 去重
+- 基于 xxh3_128(link) 去重
 """
 
 import os
 import sys
-import json
+import io
 import hashlib
 import hmac
 import base64
 import time
+import random
+import calendar
 import logging
-import concurrent.futures
+import asyncio
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Tuple, FrozenSet, AbstractSet
 
+import aiohttp
 import requests
 import feedparser
-from dateutil import parser as date_parser
+import orjson
+import xxhash
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # 导入提取原文链接的模块
@@ -32,7 +38,6 @@ import extract_links
 
 # 设置 UTF-8 输出，避免 Windows 下 GBK 编码问题
 if sys.platform == 'win32':
-    import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
@@ -53,7 +58,9 @@ MAX_CANDIDATES = 60
 TOP_N = 5
 HOURS_WINDOW = 48
 RSS_TIMEOUT = 10
-MAX_WORKERS = 5  # 并行抓取线程数
+MAX_WORKERS = 5  # HTTP 连接池大小
+RSS_CONCURRENCY = 20  # 同时进行的 RSS 请求数
+RSS_CONNECTION_LIMIT = 32  # aiohttp 连接总数上限
 
 # 路径配置
 SENT_HASHES_FILE = Path("data/sent_hashes.txt")
@@ -74,6 +81,17 @@ FEISHU_SECRET = os.getenv("FEISHU_SECRET", "")
 RSS_URLS_RAW = os.getenv("RSS_URLS", "")
 RSS_URLS = [line.strip() for line in RSS_URLS_RAW.strip().split("\n") if line.strip()]
 
+# HTTP 会话（keep-alive + 连接池）
+SESSION = requests.Session()
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate"})
+_adapter = HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=MAX_WORKERS * 2,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 # ==================== Prompts ====================
 SYSTEM_PROMPT_SCORE = """你是一名资深AI工程师和技术编辑，核心任务是从指定RSS条目中筛选出最值得企业内部AI团队关注的内容，**特别聚焦ERP系统重构与企业级应用落地**。
 
@@ -122,12 +140,20 @@ SYSTEM_PROMPT_REPORT = """你是《AI前沿信息速递》内部战略洞察简
 
 # ==================== LLM Client 抽象 ====================
 class LLMClient(ABC):
+    def __init__(self):
+        # 评分与日报生成复用同一连接，避免重复 TLS 握手；重试由各客户端自行处理
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
     @abstractmethod
     def call_json(self, system_prompt: str, user_prompt: str) -> Dict:
         pass
 
 class OpenAIClient(LLMClient):
     def __init__(self, api_key: str, model: str = "gpt-4o-2024-08-06"):
+        super().__init__()
         self.api_key = api_key
         self.model = model
         self.url = "https://api.openai.com/v1/chat/completions"
@@ -150,17 +176,18 @@ class OpenAIClient(LLMClient):
             "response_format": {"type": "json_object"}
         }
         try:
-            resp = requests.post(self.url, headers=headers, json=payload, timeout=60)
+            resp = self.session.post(self.url, headers=headers, data=orjson.dumps(payload), timeout=60)
             resp.raise_for_status()
-            data = resp.json()
+            data = orjson.loads(resp.content)
             content = data["choices"][0]["message"]["content"]
-            return json.loads(content)
+            return orjson.loads(content)
         except Exception as e:
             logger.error(f"OpenAI API Call Failed: {e}")
             sys.exit(1)
 
 class QwenClient(LLMClient):
     def __init__(self, api_key: str, model: str = "qwen-plus"):
+        super().__init__()
         self.api_key = api_key
         self.model = model
         self.url = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
@@ -182,11 +209,11 @@ class QwenClient(LLMClient):
         }
 
         try:
-            resp = requests.post(self.url, headers=headers, json=payload, timeout=60)
+            resp = self.session.post(self.url, headers=headers, data=orjson.dumps(payload), timeout=60)
             resp.raise_for_status()
-            data = resp.json()
+            data = orjson.loads(resp.content)
             content = data["choices"][0]["message"]["content"]
-            return json.loads(content)
+            return orjson.loads(content)
         except Exception as e:
             logger.error(f"Qwen API Call Failed: {e}")
             if 'resp' in locals():
@@ -195,6 +222,7 @@ class QwenClient(LLMClient):
 
 class ArkClient(LLMClient):
     def __init__(self, api_key: str, model: str):
+        super().__init__()
         self.api_key = api_key
         self.model = model
         self.url = "https://ark.cn-beijing.volces.com/api/v3/responses"
@@ -222,11 +250,12 @@ class ArkClient(LLMClient):
             ]
         }
 
+        body = orjson.dumps(payload)
         for attempt in range(3):
             try:
-                resp = requests.post(self.url, headers=headers, json=payload, timeout=120)
+                resp = self.session.post(self.url, headers=headers, data=body, timeout=120)
                 resp.raise_for_status()
-                data = resp.json()
+                data = orjson.loads(resp.content)
                 
                 content = ""
                 for output_item in data.get("output", []):
@@ -248,23 +277,26 @@ class ArkClient(LLMClient):
                     if "<简报>" in content:
                         content = content.replace("<简报>", "").replace("</简报>", "").strip()
 
-                    return json.loads(content)
-                except json.JSONDecodeError as e:
+                    return orjson.loads(content)
+                except orjson.JSONDecodeError as e:
                     # 尝试修复常见的 markdown 代码块包裹问题
                     if "```json" in content:
                         content = content.split("```json")[1].split("```")[0].strip()
-                        return json.loads(content)
+                        return orjson.loads(content)
                     elif "```" in content:
                         content = content.split("```")[1].split("```")[0].strip()
-                        return json.loads(content)
+                        return orjson.loads(content)
                     else:
-                        logger.error(f"JSON Decode Error. Content was: {content}")
+                        logger.warning(f"JSON Decode Error. Content was: {content}")
                         raise e
 
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, orjson.JSONDecodeError) as e:
+                # JSON 解析失败多为响应被截断，同样按瞬时错误重试
                 logger.warning(f"ARK API Call Failed (Attempt {attempt+1}/3): {e}")
                 if attempt < 2:
-                    time.sleep(2)
+                    # 指数退避 + 随机抖动
+                    time.sleep(min(2 ** attempt + random.random(), 10))
             except Exception as e:
                 logger.error(f"ARK API Call Failed: {e}")
                 if 'resp' in locals():
@@ -286,105 +318,158 @@ def get_llm_client() -> LLMClient:
 
 
 # ==================== 工具函数 ====================
-def load_sent_hashes() -> Set[str]:
-    """加载已发送的 hash 集合"""
+def load_sent_hashes() -> FrozenSet[str]:
+    """加载已发送的 hash 集合（只读）
+
+    每次运行最多新增 TOP_N 条，精确集合的内存开销可以忽略；
+    不使用 Bloom 过滤器，避免误判导致新文章被静默跳过。
+    """
     if not SENT_HASHES_FILE.exists():
         SENT_HASHES_FILE.parent.mkdir(parents=True, exist_ok=True)
         SENT_HASHES_FILE.touch()
-        return set()
+        return frozenset()
     with open(SENT_HASHES_FILE, "r", encoding="utf-8") as f:
-        return set(line.strip() for line in f if line.strip())
+        return frozenset(line.strip() for line in f if line.strip())
 
-def save_sent_hashes(hashes: Set[str]):
-    """保存已发送的 hash 集合"""
+def append_sent_hashes(new_hashes: AbstractSet[str]):
+    """追加新增的 hash，避免每次全量重写文件"""
+    if not new_hashes:
+        return
     SENT_HASHES_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(SENT_HASHES_FILE, "w", encoding="utf-8") as f:
-        for h in sorted(hashes):
-            f.write(h + "\n")
+    with open(SENT_HASHES_FILE, "a", encoding="utf-8") as f:
+        f.writelines(h + "\n" for h in new_hashes)
 
 def hash_link(link: str) -> str:
+    """链接去重键：xxh3_128 十六进制摘要（32 位），仅用于去重，无安全性要求"""
+    return xxhash.xxh3_128(link.encode("utf-8")).hexdigest()
+
+def legacy_hash_link(link: str) -> str:
+    """旧版去重键 sha256(link)（64 位），仅用于兼容 data/sent_hashes.txt 中的历史记录
+
+    旧记录对应的文章在切换为 xxh3_128 后超过 HOURS_WINDOW 便不会再通过时间过滤，
+    之后即可删除本函数及文件中 64 位的旧行；文件中没有旧行时该检查自动关闭。
+    """
     return hashlib.sha256(link.encode("utf-8")).hexdigest()
 
-def is_recent(published_str: str, hours: int = HOURS_WINDOW) -> bool:
-    try:
-        pub_time = date_parser.parse(published_str)
-        if pub_time.tzinfo is None:
-            pub_time = pub_time.replace(tzinfo=timezone.utc)
-        now = datetime.now(timezone.utc)
-        return (now - pub_time) <= timedelta(hours=hours)
-    except Exception:
+def recent_cutoff(hours: int = HOURS_WINDOW) -> float:
+    """时间窗口的起点（epoch 秒），每次运行计算一次"""
+    return time.time() - hours * 3600
+
+def is_recent(published_parsed: Optional[time.struct_time], cutoff: float) -> bool:
+    """published_parsed 为 feedparser 解析好的 UTC struct_time"""
+    if not published_parsed:
         return False
+    return calendar.timegm(published_parsed) >= cutoff
 
 # ==================== RSS 抓取 ====================
-def fetch_single_feed(url: str, sent_hashes: Set[str]) -> List[Dict]:
-    """抓取单个 RSS 源并过滤"""
+def parse_feed_entries(url: str, body: bytes, sent_hashes: AbstractSet[str], cutoff: float,
+                       check_legacy: bool) -> List[Dict]:
+    """解析单个 RSS 源内容并过滤"""
     candidates = []
-    try:
-        logger.info(f"抓取 RSS: {url}")
-        response = requests.get(url, timeout=RSS_TIMEOUT)
-        response.raise_for_status()
-        feed = feedparser.parse(response.content)
+    # 以文件对象传入，feedparser 直接读取已下载的缓冲区（BytesIO 共享该 bytes，不额外拷贝），
+    # 而不会先把整段内容当作文件路径尝试 open()
+    feed = feedparser.parse(io.BytesIO(body))
+
+    for entry in feed.entries:
+        link = entry.get("link", "")
+        if not link: 
+            continue
+            
+        # 当RSS源的前缀地址为http://100.68.66.102:18001/feed时，获取原文链接
+        if url.startswith("http://100.68.66.102:18001/feed"):
+            original_link = extract_links.get_original_link(link)
+            if original_link:
+                logger.info(f"替换为原文链接: {link} -> {original_link}")
+                link = original_link
+            else:
+                logger.warning(f"未找到原文链接: {link}")
         
-        for entry in feed.entries:
-            link = entry.get("link", "")
-            if not link: 
-                continue
-                
-            # 当RSS源的前缀地址为http://100.68.66.102:18001/feed时，获取原文链接
-            if url.startswith("http://100.68.66.102:18001/feed"):
-                original_link = extract_links.get_original_link(link)
-                if original_link:
-                    logger.info(f"替换为原文链接: {link} -> {original_link}")
-                    link = original_link
-                else:
-                    logger.warning(f"未找到原文链接: {link}")
+        link_hash = hash_link(link)
+        if link_hash in sent_hashes:
+            continue
             
-            link_hash = hash_link(link)
-            if link_hash in sent_hashes:
-                continue
-                
-            published = entry.get("published", entry.get("updated", ""))
-            if not is_recent(published, HOURS_WINDOW):
-                continue
-                
-            title = entry.get("title", "")
-            summary = entry.get("summary", entry.get("description", ""))
-            if len(summary) > 500:
-                summary = summary[:500] + "..."
+        published = entry.get("published") or entry.get("updated") or ""
+        published_parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+        if not is_recent(published_parsed, cutoff):
+            continue
+
+        if check_legacy and legacy_hash_link(link) in sent_hashes:
+            continue
             
-            candidates.append({
-                "title": title,
-                "link": link,
-                "summary": summary,
-                "published": published,
-                "hash": link_hash
-            })
-    except Exception as e:
-        logger.warning(f"抓取 {url} 失败: {e}")
+        title = entry.get("title") or ""
+        summary = entry.get("summary") or entry.get("description") or ""
+        n = len(summary)
+        if n > 500:
+            summary = summary[:500] + "..."
+        
+        candidates.append({
+            "title": title,
+            "link": link,
+            "summary": summary,
+            "published": published,
+            "hash": link_hash
+        })
     
     return candidates
 
-def fetch_rss_entries() -> List[Dict]:
-    """并发抓取所有 RSS 源"""
+async def fetch_single_feed(session: aiohttp.ClientSession, sem: asyncio.Semaphore,
+                            url: str, sent_hashes: AbstractSet[str], cutoff: float,
+                            check_legacy: bool) -> List[Dict]:
+    """抓取单个 RSS 源并过滤"""
+    try:
+        logger.info(f"抓取 RSS: {url}")
+        async with sem, session.get(url, timeout=aiohttp.ClientTimeout(total=RSS_TIMEOUT)) as response:
+            response.raise_for_status()
+            body = await response.read()
+        # 解析与原文链接抓取都是阻塞操作，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(parse_feed_entries, url, body, sent_hashes, cutoff, check_legacy)
+    except asyncio.TimeoutError:
+        # aiohttp 超时异常的 str() 为空，单独给出提示
+        logger.warning(f"抓取 {url} 失败: 超时（{RSS_TIMEOUT}s）")
+        return []
+    except Exception as e:
+        logger.warning(f"抓取 {url} 失败: {e}")
+        return []
+
+async def fetch_all_feeds(sent_hashes: FrozenSet[str], cutoff: float, check_legacy: bool) -> List[Dict]:
+    """并发抓取所有 RSS 源，按链接跨源去重，候选足够后取消其余请求"""
+    all_candidates = []
+    seen = set()
+    connector = aiohttp.TCPConnector(limit=RSS_CONNECTION_LIMIT)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        sem = asyncio.Semaphore(RSS_CONCURRENCY)
+        tasks = [asyncio.create_task(fetch_single_feed(session, sem, url, sent_hashes, cutoff, check_legacy)) for url in RSS_URLS]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                # 跨源去重（同一链接可能出现在多个 RSS 源中），阈值只统计不重复的条目
+                for c in await next_done:
+                    if c["link"] in seen:
+                        continue
+                    seen.add(c["link"])
+                    all_candidates.append(c)
+                if len(all_candidates) >= MAX_CANDIDATES * 2: # 稍微多抓一点也无妨，最后再截断
+                    logger.info(f"候选已达 {len(all_candidates)} 条，取消剩余 RSS 抓取")
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    return all_candidates
+
+async def fetch_rss_entries_async() -> Tuple[List[Dict], FrozenSet[str]]:
+    """并发抓取所有 RSS 源，同时返回本次加载的去重集合，供更新去重文件时复用"""
     if not RSS_URLS:
         logger.warning("RSS_URLS 为空")
-        return []
+        return [], frozenset()
 
+    # 只读快照，已取消但仍在线程中运行的解析任务也不会影响共享状态
     sent_hashes = load_sent_hashes()
+    cutoff = recent_cutoff(HOURS_WINDOW)
+    # 只有文件中仍有 64 位的 sha256 旧记录时才需要兼容检查
+    check_legacy = any(len(h) == 64 for h in sent_hashes)
     logger.info(f"配置的 RSS 源数量: {len(RSS_URLS)}")
     
-    all_candidates = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(fetch_single_feed, url, sent_hashes): url for url in RSS_URLS}
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                candidates = future.result()
-                all_candidates.extend(candidates)
-                if len(all_candidates) >= MAX_CANDIDATES * 2: # 稍微多抓一点也无妨，最后再截断
-                     # 这里其实无法立刻停止其他线程，但可以提前break loop如果需要
-                     pass
-            except Exception as e:
-                logger.error(f"线程执行异常: {e}")
+    all_candidates = await fetch_all_feeds(sent_hashes, cutoff, check_legacy)
 
     # 全局截断
     if len(all_candidates) > MAX_CANDIDATES:
@@ -392,22 +477,23 @@ def fetch_rss_entries() -> List[Dict]:
         all_candidates = all_candidates[:MAX_CANDIDATES]
         
     logger.info(f"共收集 {len(all_candidates)} 条候选")
-    return all_candidates
+    return all_candidates, sent_hashes
 
 # ==================== 评分阶段 ====================
+def _snippet(summary: Optional[str], limit: int = 120) -> str:
+    snippet = (summary or "").strip()
+    return snippet[:limit] + "..." if len(snippet) > limit else snippet
+
 def compact_for_scoring(entries: List[Dict]) -> List[Dict]:
-    compact = []
-    for e in entries:
-        snippet = (e.get("summary") or "").strip()
-        if len(snippet) > 160:
-            snippet = snippet[:160] + "..."
-        compact.append({
-            "title": (e.get("title") or "")[:120],
+    return [
+        {
+            "title": (e.get("title") or "")[:80],
             "link": e.get("link"),
             "published": e.get("published", ""),
-            "snippet": snippet
-        })
-    return compact
+            "snippet": _snippet(e.get("summary"))
+        }
+        for e in entries
+    ]
 
 def score_entries(llm_client: LLMClient, entries: List[Dict]) -> List[Dict]:
     if not entries:
@@ -415,7 +501,7 @@ def score_entries(llm_client: LLMClient, entries: List[Dict]) -> List[Dict]:
 
     user_prompt = f"""请对以下 {len(entries)} 条 RSS 条目打分：
 
-{json.dumps(compact_for_scoring(entries), ensure_ascii=False, indent=2)}
+{orjson.dumps(compact_for_scoring(entries)).decode()}
 
 返回格式：
 {{
@@ -436,12 +522,10 @@ def score_entries(llm_client: LLMClient, entries: List[Dict]) -> List[Dict]:
     link_map = {e["link"]: e for e in entries}
     top_entries = []
     for s in top_scores:
-        link = s["link"]
-        if link in link_map:
-            entry = link_map[link].copy()
-            entry["score"] = s["score"]
-            entry["score_reason"] = s["reason"]
-            top_entries.append(entry)
+        entry = link_map.get(s["link"])
+        if entry is None:
+            continue
+        top_entries.append({**entry, "score": s["score"], "score_reason": s["reason"]})
 
     logger.info(f"评分完成，Top {TOP_N}: {len(top_entries)} 条")
     return top_entries
@@ -453,7 +537,7 @@ def generate_daily_report(llm_client: LLMClient, top_entries: List[Dict]) -> Dic
     user_prompt = f"""基于以下 Top 3 RSS 条目，生成一张"终版 AI 日报卡片"的 JSON（中文），结构必须完全符合下面的 JSON 契约。
 
 【Top 3 条目】
-{json.dumps(top_entries, ensure_ascii=False, indent=2)}
+{orjson.dumps(top_entries).decode()}
 
 【JSON 契约】
 {{
@@ -558,11 +642,12 @@ def send_to_feishu(report: Dict):
         "card": card
     }
 
+    body = orjson.dumps(payload)
     for attempt in range(3):
         try:
-            resp = requests.post(FEISHU_WEBHOOK_URL, json=payload, timeout=10)
+            resp = SESSION.post(FEISHU_WEBHOOK_URL, headers={"Content-Type": "application/json"}, data=body, timeout=10)
             resp.raise_for_status()
-            res_json = resp.json()
+            res_json = orjson.loads(resp.content)
             if res_json.get("code") == 0:
                 logger.info("飞书推送成功")
                 return
@@ -581,7 +666,7 @@ def main():
     llm_client = get_llm_client()
 
     # 1. 抓取 RSS
-    candidates = fetch_rss_entries()
+    candidates, sent_hashes = asyncio.run(fetch_rss_entries_async())
     if not candidates:
         logger.info("无新内容，退出")
         return
@@ -595,16 +680,14 @@ def main():
     # 3. 生成日报
     report = generate_daily_report(llm_client, top_entries)
     logger.info("日报生成完成")
-    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
 
     # 4. 发送飞书
     send_to_feishu(report)
 
-    # 5. 更新去重文件
-    sent_hashes = load_sent_hashes()
-    new_hashes = {e["hash"] for e in top_entries}
-    sent_hashes.update(new_hashes)
-    save_sent_hashes(sent_hashes)
+    # 5. 更新去重文件（复用抓取时加载的集合）
+    new_hashes = {e["hash"] for e in top_entries} - sent_hashes
+    append_sent_hashes(new_hashes)
     logger.info(f"已更新去重文件，新增 {len(new_hashes)} 条")
 
 if __name__ == "__main__":